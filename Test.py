@@ -30,32 +30,96 @@ import json
 import time
 from datetime import datetime
 import io
-import trimesh
-import cadquery as cq
-from stpyvista import stpyvista
-import pyvista as pv
 import glob
 from pathlib import Path
-import pyvista as pv
-
-# 1. Iniciar la pantalla virtual (Crucial para Streamlit Cloud)
-if 'XVFB_STARTED' not in st.session_state:
-    pv.start_xvfb()
-    st.session_state['XVFB_STARTED'] = True
-
-# 2. Configurar PyVista para que no busque una GPU real
-pv.OFF_SCREEN = True
-
-# Configurar pyvista
-pv.set_jupyter_backend('static')
+from render_pool import (RenderPool, RenderPoolBusy, RenderTimeout, RenderError,
+                         clean_mesh_store, hex_to_rgb, publish_mesh, touch_mesh)
+from quote_pdf import make_executor, quote_to_pdf, write_quotes_zip
+from mesh_bodies import split_bodies
+
+# Los módulos pesados (trimesh, cadquery) se importan bajo demanda: cotizar un
+# modelo no debe pagar el arranque de OCC. pyvista/VTK solo se cargan en los
+# procesos del pool de render, nunca en el proceso de Streamlit.
+
+@st.cache_resource(show_spinner=False)
+def _load_trimesh():
+    """Importa trimesh la primera vez que se analiza un modelo"""
+    import trimesh
+    return trimesh
+
+@st.cache_resource(show_spinner=False)
+def _load_cadquery():
+    """Importa cadquery solo cuando se exporta a STEP"""
+    import cadquery as cq
+    return cq
+
+@st.cache_resource(show_spinner=False)
+def _get_render_pool():
+    """Pool de workers de render compartido por todas las sesiones del proceso"""
+    workers = os.environ.get("COTIZADOR_RENDER_WORKERS")
+    return RenderPool(workers=int(workers) if workers else None)
+
+@st.cache_resource(show_spinner=False)
+def _get_pdf_executor():
+    """Procesos para generar PDF en lote, compartidos por todas las sesiones"""
+    workers = os.environ.get("COTIZADOR_PDF_WORKERS")
+    return make_executor(workers=int(workers) if workers else None)
+
+class ModelRecord:
+    """Modelo compacto por sesión: arrays planos y métricas precalculadas
+
+    Es lo único que se conserva del modelo entre ejecuciones del script; el
+    ``trimesh.Trimesh`` se reconstruye desde aquí cuando hace falta.
+    """
+
+    __slots__ = ('vertices', 'faces', 'volume_mm3', 'bounds', 'is_watertight', 'bodies')
+
+    def __init__(self, vertices, faces, volume_mm3, bounds, is_watertight, bodies):
+        self.vertices = vertices
+        self.faces = faces
+        self.volume_mm3 = volume_mm3
+        self.bounds = bounds
+        self.is_watertight = is_watertight
+        self.bodies = bodies
+
+    @classmethod
+    def from_trimesh(cls, mesh):
+        """Copia la geometría a float32/uint32 y calcula las métricas una vez"""
+        vertices = np.ascontiguousarray(mesh.vertices, dtype=np.float32)
+        faces = np.ascontiguousarray(mesh.faces, dtype=np.uint32)
+        vertices.setflags(write=False)
+        faces.setflags(write=False)
+
+        # El volumen del conjunto es la suma de los cuerpos con sus huecos ya
+        # descontados, también si alguno tiene las normales invertidas
+        bodies = split_bodies(mesh.vertices, mesh.faces)
+        volume_mm3 = float(bodies['volume_mm3'][bodies['cavity_of'] < 0].sum())
+
+        return cls(vertices, faces,
+                   volume_mm3,
+                   mesh.bounds.tolist(),
+                   bool(mesh.is_watertight),
+                   bodies)
+
+    def to_trimesh(self):
+        """Reconstruye un Trimesh sin reprocesar la geometría"""
+        return _load_trimesh().Trimesh(vertices=self.vertices.astype(np.float64),
+                                       faces=self.faces.astype(np.int64),
+                                       process=False)
+
+    @property
+    def nbytes(self):
+        return (self.vertices.nbytes + self.faces.nbytes
+                + sum(values.nbytes for values in self.bodies.values()))
 
 class ModelVisualizer3D:
     """Clase para manejar la visualización 3D de modelos usando cadquery y pyvista"""
 
     def __init__(self):
-        self.mesh = None
+        self.model = None
+        self._mesh = None
+        self.mesh_key = None
         self.cq_obj = None
-        self.plotter = None
         self.model_color = "#4ECDC4"
         self.auto_rotate = False
         self.wireframe = False
@@ -75,23 +139,19 @@ class ModelVisualizer3D:
                 tmp_file.write(file_bytes)
                 tmp_path = tmp_file.name
 
-            # Cargar con trimesh para análisis
-            self.mesh = trimesh.load(tmp_path)
+            # Cargar con trimesh para análisis y quedarse solo con el registro compacto
+            mesh = _load_trimesh().load(tmp_path)
+            self.model = ModelRecord.from_trimesh(mesh)
+            self._mesh = None
 
             # Intentar extraer colores originales si existen
-            self._extract_original_colors()
+            self._extract_original_colors(mesh)
 
-            # También intentar cargar con cadquery
-            try:
-                if filename.endswith('.step'):
-                    self.cq_obj = cq.importers.importStep(tmp_path)
-                else:
-                    try:
-                        self.cq_obj = cq.importers.import_stl(tmp_path)
-                    except AttributeError:
-                        self.cq_obj = cq.importers.importStl(tmp_path)
-            except Exception:
-                self.cq_obj = None
+            # Referencia en el almacén de meshes del pool; se publica al renderizar
+            self.mesh_key = None
+
+            # El objeto cadquery se construye al exportar a STEP (ver _get_cq_obj)
+            self.cq_obj = None
 
             return True
 
@@ -107,104 +167,163 @@ class ModelVisualizer3D:
                 except:
                     pass
 
-    def _extract_original_colors(self):
+    def _extract_original_colors(self, mesh):
         """Intenta extraer colores originales del mesh"""
         try:
-            if hasattr(self.mesh, 'visual') and hasattr(self.mesh.visual, 'vertex_colors'):
-                if self.mesh.visual.vertex_colors is not None and len(self.mesh.visual.vertex_colors) > 0:
-                    colors = self.mesh.visual.vertex_colors[:100]
+            if hasattr(mesh, 'visual') and hasattr(mesh.visual, 'vertex_colors'):
+                if mesh.visual.vertex_colors is not None and len(mesh.visual.vertex_colors) > 0:
+                    colors = np.array(mesh.visual.vertex_colors[:100])
                     avg_color = colors.mean(axis=0) / 255.0
                     self.model_color = f"#{int(avg_color[0]*255):02x}{int(avg_color[1]*255):02x}{int(avg_color[2]*255):02x}"
                     self.original_colors = colors
         except:
             self.original_colors = None
 
+    @property
+    def mesh(self):
+        """Trimesh del modelo, reconstruido bajo demanda y liberado en release()"""
+        if self.model is None:
+            return None
+        if self._mesh is None:
+            self._mesh = self.model.to_trimesh()
+        return self._mesh
+
+    def release(self):
+        """Libera los objetos pesados; se llama al terminar cada ejecución del script"""
+        self._mesh = None
+        self.cq_obj = None
+
+    def memory_usage(self):
+        """Bytes retenidos por la sesión en el visualizador, por componente"""
+        usage = {'model': 0, 'mesh': 0, 'colors': 0}
+        if self.model is not None:
+            usage['model'] = self.model.nbytes
+        if self._mesh is not None:
+            usage['mesh'] = self._mesh.vertices.nbytes + self._mesh.faces.nbytes
+        if self.original_colors is not None:
+            usage['colors'] = self.original_colors.nbytes
+        return usage
+
     def get_model_info(self):
         """Obtiene información del modelo cargado"""
-        if self.mesh is None:
+        if self.model is None:
             return None
 
+        bounds = self.model.bounds
         info = {
-            'volume_mm3': self.mesh.volume,
-            'volume_cm3': self.mesh.volume / 1000,
-            'dimensions_mm': (self.mesh.bounds[1] - self.mesh.bounds[0]).tolist(),
-            'bounds': self.mesh.bounds.tolist(),
-            'is_watertight': self.mesh.is_watertight,
-            'vertices_count': len(self.mesh.vertices),
-            'faces_count': len(self.mesh.faces)
+            'volume_mm3': self.model.volume_mm3,
+            'volume_cm3': self.model.volume_mm3 / 1000,
+            'dimensions_mm': [hi - lo for lo, hi in zip(bounds[0], bounds[1])],
+            'bounds': bounds,
+            'is_watertight': self.model.is_watertight,
+            'vertices_count': len(self.model.vertices),
+            'faces_count': len(self.model.faces),
+            'bodies_count': int(((self.model.bodies['cavity_of'] < 0)
+                                 & (self.model.bodies['volume_mm3'] > 0)).sum())
         }
 
         return info
 
-    def create_3d_view(self, show_original_colors=False):
-        """Crea una vista 3D con controles básicos"""
-        if self.mesh is None:
+    def get_bodies_info(self):
+        """Cuerpos sólidos del modelo, de mayor a menor volumen
+
+        Los huecos internos no se cotizan por separado: su volumen ya está
+        descontado del cuerpo que los encierra.
+        """
+        if self.model is None:
+            return []
+
+        bodies = self.model.bodies
+        solid = np.flatnonzero((bodies['cavity_of'] < 0) & (bodies['volume_mm3'] > 0))
+        solid = solid[np.argsort(-bodies['volume_mm3'][solid], kind='stable')]
+
+        return [{
+            'index': int(i),
+            'volume_mm3': float(bodies['volume_mm3'][i]),
+            'volume_cm3': float(bodies['volume_mm3'][i]) / 1000,
+            'dimensions_mm': (bodies['bounds'][i][1] - bodies['bounds'][i][0]).tolist(),
+            'bounds': bodies['bounds'][i].tolist(),
+            'is_watertight': bool(bodies['is_watertight'][i]),
+            'faces_count': int(bodies['faces_count'][i]),
+            'vertices_count': int(bodies['vertices_count'][i])
+        } for i in solid]
+
+    def scene_request(self, show_original_colors=False):
+        """Describe la escena a renderizar: referencia al mesh, colores y estilo"""
+        if self.mesh_key is None or not touch_mesh(self.mesh_key):
+            self.mesh_key = publish_mesh(self.model.vertices, self.model.faces)
+
+        return {
+            'mesh_key': self.mesh_key,
+            'model_color': self.model_color,
+            'background_color': self.background_color,
+            'wireframe': self.wireframe,
+            'show_axes': self.show_axes,
+            'show_grid': self.show_grid,
+            'vertex_colors': self.original_colors if show_original_colors else None,
+            'window_size': (800, 600)
+        }
+
+    def render_image(self, show_original_colors=False):
+        """Renderiza el modelo en el pool de workers y devuelve un PNG"""
+        if self.model is None:
             return None
 
         try:
-            plotter = pv.Plotter(window_size=[800, 600])
-
-            vertices = self.mesh.vertices
-            faces = np.hstack([np.full((len(self.mesh.faces), 1), 3), self.mesh.faces]).flatten()
-            pv_mesh = pv.PolyData(vertices, faces)
-
-            # Configurar estilo de renderizado
-            if show_original_colors and self.original_colors is not None:
-                colors = self.original_colors[:len(vertices)] / 255.0
-                plotter.add_mesh(pv_mesh,
-                               scalars=colors,
-                               rgb=True,
-                               smooth_shading=True,
-                               show_edges=False,
-                               specular=0.5,
-                               specular_power=20)
-            else:
-                color_rgb = self._hex_to_rgb(self.model_color)
-
-                if self.wireframe:
-                    plotter.add_mesh(pv_mesh,
-                                   color=color_rgb,
-                                   style='wireframe',
-                                   line_width=1.5,
-                                   opacity=0.8)
-                else:
-                    plotter.add_mesh(pv_mesh,
-                                   color=color_rgb,
-                                   smooth_shading=True,
-                                   show_edges=True,
-                                   edge_color='black',
-                                   line_width=0.3)
-
-            plotter.set_background(self.background_color)
+            return _get_render_pool().render(self.scene_request(show_original_colors))
+        except RenderPoolBusy:
+            st.warning("⏳ El servidor de render está ocupado, intenta de nuevo en unos segundos")
+            return None
+        except (RenderTimeout, RenderError) as e:
+            st.error(f"Error creando vista 3D: {str(e)}")
+            return None
 
-            if self.show_axes:
-                plotter.add_axes(line_width=4)
+    def render_thumbnail(self):
+        """Miniatura del modelo para documentos; None si el render no está disponible"""
+        if self.model is None:
+            return None
 
-            if self.show_grid:
-                plotter.show_grid(color='gray')
+        scene = self.scene_request()
+        scene.update({'window_size': (400, 300), 'show_axes': False, 'show_grid': False})
+        try:
+            return _get_render_pool().render(scene, timeout=15)
+        except (RenderPoolBusy, RenderTimeout, RenderError):
+            return None
 
-            # CORRECCIÓN: Cambiar 'isometric' por 'iso'
-            plotter.camera_position = 'iso'  # ← 'iso' en lugar de 'isometric'
-            plotter.camera.azimuth = 45
-            plotter.camera.elevation = 30
-            plotter.reset_camera()
+    def _hex_to_rgb(self, hex_color):
+        """Convierte color HEX a RGB normalizado (0-1)"""
+        return hex_to_rgb(hex_color)
 
-            self.plotter = plotter
+    def _get_cq_obj(self):
+        """Construye (una vez) el objeto cadquery a partir del mesh cargado"""
+        if self.cq_obj is not None or self.model is None:
+            return self.cq_obj
 
-            return plotter
+        cq = _load_cadquery()
+        tmp_path = None
+        try:
+            with tempfile.NamedTemporaryFile(suffix='.stl', delete=False) as tmp_file:
+                tmp_path = tmp_file.name
+            self.mesh.export(tmp_path)
 
-        except Exception as e:
-            st.error(f"Error creando vista 3D: {str(e)}")
-            return None
+            try:
+                self.cq_obj = cq.importers.import_stl(tmp_path)
+            except AttributeError:
+                self.cq_obj = cq.importers.importStl(tmp_path)
+        except Exception:
+            self.cq_obj = None
+        finally:
+            if tmp_path and os.path.exists(tmp_path):
+                try:
+                    os.unlink(tmp_path)
+                except:
+                    pass
 
-    def _hex_to_rgb(self, hex_color):
-        """Convierte color HEX a RGB normalizado (0-1)"""
-        hex_color = hex_color.lstrip('#')
-        return tuple(int(hex_color[i:i+2], 16) / 255 for i in (0, 2, 4))
+        return self.cq_obj
 
     def export_model(self, session_id, model_name="model"):
         """Exporta el modelo en diferentes formatos - FUNCIÓN DEL CRYSTAL GENERATOR"""
-        if self.cq_obj is None:
+        if self.model is None:
             return False
 
         try:
@@ -212,9 +331,12 @@ class ModelVisualizer3D:
             export_path = f"app/static/{model_name}_{session_id}.{self.export_type}"
 
             if self.export_type == 'step':
-                cq.exporters.export(self.cq_obj, export_path)
-            else:  # stl por defecto
-                cq.exporters.export(self.cq_obj, export_path)
+                cq_obj = self._get_cq_obj()
+                if cq_obj is None:
+                    return False
+                _load_cadquery().exporters.export(cq_obj, export_path)
+            else:  # stl por defecto, sin pasar por cadquery
+                self.mesh.export(export_path)
 
             return True
         except Exception as e:
@@ -272,6 +394,39 @@ def __clean_up_static_files():
                 except:
                     pass
 
+    # Meshes del pool de render sin uso reciente
+    clean_mesh_store(max_age_seconds=600)
+
+def calculate_costs(volume_cm3, density, infill, layer_height, supports,
+                    material_cost_kg, hourly_rate, profit_margin):
+    """Calcula peso, tiempo y costos de impresión para un volumen dado"""
+    effective_volume_cm3 = volume_cm3 * (infill / 100)
+    weight_grams = effective_volume_cm3 * density
+    weight_kg = weight_grams / 1000
+    material_cost = weight_kg * material_cost_kg
+
+    # Tiempo estimado
+    base_time_hours = (volume_cm3 / 8) * (0.2 / layer_height)
+    complexity_factor = 1.3 if supports else 1.0
+    estimated_hours = base_time_hours * complexity_factor
+
+    if estimated_hours < 0.5:
+        estimated_hours = 0.5
+
+    labor_cost = estimated_hours * hourly_rate
+    total_cost = material_cost + labor_cost
+    final_price = total_cost * (1 + profit_margin / 100)
+
+    return {
+        'effective_volume_cm3': effective_volume_cm3,
+        'weight_grams': weight_grams,
+        'material_cost': material_cost,
+        'estimated_hours': estimated_hours,
+        'labor_cost': labor_cost,
+        'total_cost': total_cost,
+        'final_price': final_price
+    }
+
 def __make_tabs():
     upload_tab, calculation_tab, visualization_tab, generator_tab, settings_tab = st.tabs([
         "📤 Cargar Modelo",
@@ -293,47 +448,63 @@ def __make_tabs():
 
         if uploaded_file is not None:
             try:
-                file_bytes = uploaded_file.read()
-
-                with st.spinner("Cargando y analizando modelo 3D..."):
-                    success = st.session_state.visualizer.load_stl_from_bytes(file_bytes, uploaded_file.name)
-
-                    if success:
-                        model_info = st.session_state.visualizer.get_model_info()
-
-                        st.session_state['current_model'] = {
-                            'filename': uploaded_file.name,
-                            'volume_mm3': model_info['volume_mm3'],
-                            'volume_cm3': model_info['volume_cm3'],
-                            'dimensions_mm': model_info['dimensions_mm'],
-                            'bounds': model_info['bounds'],
-                            'file_size': len(file_bytes),
-                            'vertices_count': model_info['vertices_count'],
-                            'faces_count': model_info['faces_count'],
-                            'is_watertight': model_info['is_watertight'],
-                            'analysis_method': 'trimesh/cadquery'
-                        }
-
-                        st.success(f"✅ {uploaded_file.name} cargado correctamente")
-
-                        # Vista previa 3D
-                        with st.expander("👁️ Vista previa 3D", expanded=True):
-                            plotter = st.session_state.visualizer.create_3d_view()
-
-                            if plotter:
-                                try:
-                                    stpyvista(plotter, key="preview_viewer", horizontal_align="center")
-
-                                    col1, col2 = st.columns(2)
-                                    with col1:
-                                        if st.button("🎨 Ir a visualización completa",
-                                                    type="primary",
-                                                    use_container_width=True,
-                                                    key="go_to_viz_from_upload"):
-                                            st.session_state['active_tab'] = 2
-                                            st.rerun()
-                                except Exception as e:
-                                    st.error(f"Error mostrando visualización: {str(e)}")
+                # El archivo se analiza una sola vez; las demás ejecuciones reutilizan el registro
+                if st.session_state.get('loaded_file_id') != uploaded_file.file_id:
+                    file_bytes = uploaded_file.read()
+
+                    with st.spinner("Cargando y analizando modelo 3D..."):
+                        success = st.session_state.visualizer.load_stl_from_bytes(file_bytes, uploaded_file.name)
+
+                        if success:
+                            model_info = st.session_state.visualizer.get_model_info()
+
+                            st.session_state['current_model'] = {
+                                'filename': uploaded_file.name,
+                                'volume_mm3': model_info['volume_mm3'],
+                                'volume_cm3': model_info['volume_cm3'],
+                                'dimensions_mm': model_info['dimensions_mm'],
+                                'bounds': model_info['bounds'],
+                                'file_size': len(file_bytes),
+                                'vertices_count': model_info['vertices_count'],
+                                'faces_count': model_info['faces_count'],
+                                'is_watertight': model_info['is_watertight'],
+                                'bodies_count': model_info['bodies_count'],
+                                'analysis_method': 'trimesh/cadquery'
+                            }
+                            st.session_state['loaded_file_id'] = uploaded_file.file_id
+                            st.session_state['preview_image'] = None
+
+                    del file_bytes
+
+                if st.session_state.get('loaded_file_id') == uploaded_file.file_id:
+                    model = st.session_state['current_model']
+
+                    st.success(f"✅ {uploaded_file.name} cargado correctamente")
+
+                    if model['bodies_count'] > 1:
+                        st.info(f"🧩 El archivo contiene {model['bodies_count']} cuerpos separados. "
+                                "Puedes cotizarlos por separado en la pestaña 'Cotización'.")
+
+                    # Vista previa 3D (se renderiza una vez por archivo)
+                    with st.expander("👁️ Vista previa 3D", expanded=True):
+                        if st.session_state.get('preview_image') is None:
+                            st.session_state['preview_image'] = st.session_state.visualizer.render_image()
+                        preview = st.session_state['preview_image']
+
+                        if preview:
+                            try:
+                                st.image(preview, use_container_width=True)
+
+                                col1, col2 = st.columns(2)
+                                with col1:
+                                    if st.button("🎨 Ir a visualización completa",
+                                                type="primary",
+                                                use_container_width=True,
+                                                key="go_to_viz_from_upload"):
+                                        st.session_state['active_tab'] = 2
+                                        st.rerun()
+                            except Exception as e:
+                                st.error(f"Error mostrando visualización: {str(e)}")
 
                 # Mostrar métricas
                 if 'current_model' in st.session_state:
@@ -354,6 +525,8 @@ def __make_tabs():
             except Exception as e:
                 st.error(f"❌ Error al procesar el archivo: {str(e)}")
         else:
+            # El widget ya no retiene el archivo; el modelo analizado sigue disponible
+            st.session_state['loaded_file_id'] = None
             st.info("👆 Arrastra o haz clic para subir un archivo STL")
 
     with calculation_tab:
@@ -461,24 +634,68 @@ def __make_tabs():
                 key="profit_margin_slider"
             )
 
-        # Cálculos
-        try:
-            effective_volume_cm3 = model['volume_cm3'] * (infill / 100)
-            weight_grams = effective_volume_cm3 * density
-            weight_kg = weight_grams / 1000
-            material_cost = weight_kg * material_cost_kg
-
-            # Tiempo estimado
-            base_time_hours = (model['volume_cm3'] / 8) * (0.2 / layer_height)
-            complexity_factor = 1.3 if supports else 1.0
-            estimated_hours = base_time_hours * complexity_factor
+        pricing = (density, infill, layer_height, supports, material_cost_kg, hourly_rate, profit_margin)
+
+        # Cuerpos separados dentro del mismo archivo
+        bodies = st.session_state.visualizer.get_bodies_info() if model.get('bodies_count', 1) > 1 else []
+
+        if len(bodies) > 1:
+            st.subheader(f"🧩 {len(bodies)} cuerpos detectados")
+
+            body_prices = [calculate_costs(body['volume_cm3'], *pricing)['final_price'] for body in bodies]
+            st.dataframe(
+                [{
+                    'Cuerpo': n + 1,
+                    'Volumen (cm³)': round(body['volume_cm3'], 2),
+                    'Dimensiones (mm)': "×".join(f"{d:.1f}" for d in body['dimensions_mm']),
+                    'Cerrado': "✅" if body['is_watertight'] else "⚠️",
+                    f'Precio ({currency_symbol})': round(price, 2)
+                } for n, (body, price) in enumerate(zip(bodies, body_prices))],
+                use_container_width=True,
+                hide_index=True
+            )
+            st.caption(f"Suma de cotizaciones individuales: {currency_symbol} {sum(body_prices):.2f}")
+
+            open_bodies = [str(n + 1) for n, body in enumerate(bodies) if not body['is_watertight']]
+            if open_bodies:
+                st.warning(f"⚠️ Malla abierta en los cuerpos {', '.join(open_bodies)}: "
+                           "su volumen es aproximado, conviene reparar el archivo antes de imprimir.")
+
+            quote_mode = st.radio(
+                "Cotizar como",
+                ["Conjunto", "Cuerpo individual"],
+                horizontal=True,
+                key="quote_mode_radio"
+            )
 
-            if estimated_hours < 0.5:
-                estimated_hours = 0.5
+            if quote_mode == "Cuerpo individual":
+                body_number = st.selectbox(
+                    "Cuerpo",
+                    range(1, len(bodies) + 1),
+                    format_func=lambda n: f"Cuerpo {n} ({bodies[n - 1]['volume_cm3']:.2f} cm³)",
+                    key="body_select"
+                )
+                body = bodies[body_number - 1]
+                model = dict(model,
+                             volume_mm3=body['volume_mm3'],
+                             volume_cm3=body['volume_cm3'],
+                             dimensions_mm=body['dimensions_mm'],
+                             bounds=body['bounds'],
+                             is_watertight=body['is_watertight'],
+                             faces_count=body['faces_count'],
+                             vertices_count=body['vertices_count'],
+                             body=body_number)
 
-            labor_cost = estimated_hours * hourly_rate
-            total_cost = material_cost + labor_cost
-            final_price = total_cost * (1 + profit_margin / 100)
+        # Cálculos
+        try:
+            costs = calculate_costs(model['volume_cm3'], *pricing)
+            effective_volume_cm3 = costs['effective_volume_cm3']
+            weight_grams = costs['weight_grams']
+            material_cost = costs['material_cost']
+            estimated_hours = costs['estimated_hours']
+            labor_cost = costs['labor_cost']
+            total_cost = costs['total_cost']
+            final_price = costs['final_price']
 
             # Mostrar resultados
             results_col1, results_col2 = st.columns(2)
@@ -502,16 +719,32 @@ def __make_tabs():
                 quotation = {
                     'id': str(uuid4())[:8],
                     'timestamp': datetime.now().isoformat(),
-                    'model': st.session_state['current_model'],
+                    'model': model,
                     'calculations': {
                         'final_price': final_price,
-                        'currency': currency_symbol
+                        'currency': currency_symbol,
+                        'material': material_option,
+                        'density': density,
+                        'infill': infill,
+                        'layer_height': layer_height,
+                        'supports': supports,
+                        'weight_grams': weight_grams,
+                        'estimated_hours': estimated_hours,
+                        'material_cost': material_cost,
+                        'labor_cost': labor_cost,
+                        'profit_margin': profit_margin,
+                        'profit': final_price - total_cost
                     }
                 }
 
                 st.session_state['last_quotation'] = quotation
                 st.session_state['quotations'] = st.session_state.get('quotations', []) + [quotation]
 
+                # Miniatura para el PDF (fuera de la cotización para que siga siendo JSON)
+                thumbnail = st.session_state.visualizer.render_thumbnail()
+                if thumbnail:
+                    st.session_state.setdefault('quote_thumbnails', {})[quotation['id']] = thumbnail
+
                 json_str = json.dumps(quotation, indent=2, ensure_ascii=False)
 
                 st.success(f"✅ Cotización {quotation['id']} generada!")
@@ -525,6 +758,15 @@ def __make_tabs():
                     key=f"download_quotation_{quotation['id']}"
                 )
 
+                st.download_button(
+                    label="📄 Descargar PDF",
+                    data=quote_to_pdf(quotation, thumbnail),
+                    file_name=f"cotizacion_{quotation['id']}.pdf",
+                    mime="application/pdf",
+                    use_container_width=True,
+                    key=f"download_quotation_pdf_{quotation['id']}"
+                )
+
         except Exception as e:
             st.error(f"❌ Error en los cálculos: {str(e)}")
 
@@ -595,10 +837,19 @@ def __make_tabs():
         # Generar y mostrar visualización 3D
         with st.spinner("Generando visualización 3D..."):
             try:
-                plotter = st.session_state.visualizer.create_3d_view()
-
-                if plotter:
-                    stpyvista(plotter, key="main_3d_viewer", horizontal_align="center")
+                # Todas las pestañas se ejecutan en cada interacción: solo se pide
+                # un render nuevo al pool cuando cambian el mesh o el estilo
+                scene = st.session_state.visualizer.scene_request()
+                view_key = tuple(scene[key] for key in ('mesh_key', 'model_color', 'background_color',
+                                                        'wireframe', 'show_axes', 'show_grid'))
+                if st.session_state.get('view_image_key') != view_key:
+                    st.session_state['view_image'] = st.session_state.visualizer.render_image()
+                    # Si el render falla, se reintenta en la siguiente ejecución
+                    st.session_state['view_image_key'] = view_key if st.session_state['view_image'] else None
+                view = st.session_state['view_image']
+
+                if view:
+                    st.image(view, use_container_width=True)
                     st.success("✅ Visualización 3D lista")
 
                     # Botón para exportar modelo
@@ -687,9 +938,55 @@ def __make_tabs():
                         symbol = quote['calculations']['currency']
                         price = quote['calculations']['final_price']
                         st.write(f"**Precio:** {symbol} {price:.2f}")
+
+            # Todas las cotizaciones del historial en PDF, empaquetadas en un ZIP
+            quotations = st.session_state['quotations']
+            if st.button(f"📦 Generar PDFs del historial ({len(quotations)})", key="generate_quotes_zip_btn"):
+                with st.spinner("Generando PDFs..."):
+                    with tempfile.NamedTemporaryFile(suffix='.zip', delete=False) as zip_file:
+                        count = write_quotes_zip(quotations, zip_file,
+                                                 thumbnails=st.session_state.get('quote_thumbnails'),
+                                                 executor=_get_pdf_executor())
+
+                # download_button lee el ZIP completo en memoria al registrarlo,
+                # así que el archivo temporal se puede borrar justo después
+                try:
+                    with open(zip_file.name, 'rb') as zip_data:
+                        st.download_button(
+                            label=f"📥 Descargar ZIP ({count} PDF)",
+                            data=zip_data,
+                            file_name=f"cotizaciones_{st.session_state['session_id']}.zip",
+                            mime="application/zip",
+                            use_container_width=True,
+                            key="download_quotes_zip"
+                        )
+                finally:
+                    os.unlink(zip_file.name)
         else:
             st.info("No hay cotizaciones en el historial aún.")
 
+        # Memoria retenida por esta sesión entre ejecuciones
+        st.subheader("🧠 Memoria de la sesión")
+
+        usage = st.session_state.visualizer.memory_usage()
+        usage['thumbnails'] = sum(len(t) for t in st.session_state.get('quote_thumbnails', {}).values())
+        usage['quotations'] = len(json.dumps(st.session_state.get('quotations', []), ensure_ascii=False))
+        usage['preview'] = (len(st.session_state.get('preview_image') or b'')
+                            + len(st.session_state.get('view_image') or b''))
+        # Streamlit conserva los bytes del STL mientras siga en el widget de carga
+        current_model = st.session_state.get('current_model')
+        usage['upload'] = current_model['file_size'] if current_model and st.session_state.get('loaded_file_id') else 0
+
+        mem_col1, mem_col2, mem_col3, mem_col4 = st.columns(4)
+        with mem_col1:
+            st.metric("Total", f"{sum(usage.values()) / 1024:.1f} KiB")
+        with mem_col2:
+            st.metric("Archivo subido", f"{usage['upload'] / 1024:.1f} KiB")
+        with mem_col3:
+            st.metric("Modelo", f"{(usage['model'] + usage['colors'] + usage['preview']) / 1024:.1f} KiB")
+        with mem_col4:
+            st.metric("Cotizaciones", f"{(usage['quotations'] + usage['thumbnails']) / 1024:.1f} KiB")
+
         # Limpiar archivos temporales
         st.subheader("🧹 Mantenimiento")
 
@@ -704,6 +1001,7 @@ def __initialize_session():
         st.session_state['session_id'] = str(uuid4())[:8]
         st.session_state['current_model'] = None
         st.session_state['quotations'] = []
+        st.session_state['quote_thumbnails'] = {}
         st.session_state['custom_materials'] = []
         st.session_state['active_tab'] = 0
 
@@ -772,10 +1070,16 @@ if __name__ == "__main__":
     os.makedirs("app/static", exist_ok=True)
 
     # Inicializar y ejecutar
-    __initialize_session()
-    __make_sidebar()
-    __make_app()
-    __clean_up_static_files()  # Limpiar archivos antiguos
+    try:
+        __initialize_session()
+        __make_sidebar()
+        __make_app()
+        __clean_up_static_files()  # Limpiar archivos antiguos
+    finally:
+        # Entre ejecuciones la sesión solo conserva el registro compacto del modelo,
+        # también si la ejecución termina con st.rerun() o con una excepción
+        if 'visualizer' in st.session_state:
+            st.session_state.visualizer.release()
 
 
 
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark de separación en cuerpos (componentes conexas).
+
+Genera una "nube de fragmentos" con miles de esferas pequeñas en un solo
+mesh y mide split_bodies frente a trimesh.Trimesh.split. Después mide el caso
+de los huecos internos: una carcasa de ~80k caras con miles de fragmentos
+invertidos dentro, que split_bodies debe asignar a la carcasa.
+
+Uso:
+    python benchmarks/bench_bodies.py [--fragments 5000] [--subdivisions 1] [--cavities 2000]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mesh_bodies import split_bodies  # noqa: E402
+
+def _fragments(count, subdivisions, low=0, high=1000, inverted=False):
+    import trimesh
+    sphere = trimesh.creation.icosphere(subdivisions=subdivisions, radius=1.0)
+    if inverted:
+        sphere.invert()
+    offsets = np.random.default_rng(0).uniform(low, high, size=(count, 3))
+
+    vertices = (sphere.vertices[None, :, :] + offsets[:, None, :]).reshape(-1, 3)
+    faces = (sphere.faces[None, :, :]
+             + (np.arange(count) * len(sphere.vertices))[:, None, None]).reshape(-1, 3)
+    return vertices, faces
+
+def _shell_with_cavities(count, subdivisions):
+    """Carcasa esférica de 81920 caras con ``count`` fragmentos invertidos dentro"""
+    import trimesh
+    shell = trimesh.creation.icosphere(subdivisions=6, radius=500.0)
+    vertices, faces = _fragments(count, subdivisions, low=-250, high=250, inverted=True)
+    return (np.vstack([shell.vertices, vertices]),
+            np.vstack([shell.faces, faces + len(shell.vertices)]))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--fragments", type=int, default=5000)
+    parser.add_argument("--subdivisions", type=int, default=1)
+    parser.add_argument("--cavities", type=int, default=2000,
+                        help="fragmentos invertidos dentro de la carcasa (0 para omitir)")
+    parser.add_argument("--skip-trimesh", action="store_true",
+                        help="no medir trimesh.split (lento con muchos fragmentos)")
+    args = parser.parse_args()
+
+    vertices, faces = _fragments(args.fragments, args.subdivisions)
+    print(f"{args.fragments} fragmentos, {len(faces)} caras")
+
+    t0 = time.perf_counter()
+    bodies = split_bodies(vertices, faces)
+    elapsed = time.perf_counter() - t0
+    print(f"split_bodies     {elapsed * 1000:8.1f} ms  cuerpos: {len(bodies['volume_mm3'])}")
+
+    if not args.skip_trimesh:
+        import trimesh
+        mesh = trimesh.Trimesh(vertices=vertices, faces=faces, process=False)
+        t0 = time.perf_counter()
+        parts = mesh.split(only_watertight=False)
+        elapsed = time.perf_counter() - t0
+        print(f"trimesh.split    {elapsed * 1000:8.1f} ms  cuerpos: {len(parts)}")
+
+    if args.cavities:
+        vertices, faces = _shell_with_cavities(args.cavities, args.subdivisions)
+        print(f"\ncarcasa con {args.cavities} huecos invertidos, {len(faces)} caras")
+
+        t0 = time.perf_counter()
+        bodies = split_bodies(vertices, faces)
+        elapsed = time.perf_counter() - t0
+        assigned = int((bodies['cavity_of'] >= 0).sum())
+        print(f"split_bodies     {elapsed * 1000:8.1f} ms  huecos asignados: {assigned}/{args.cavities}")
+
+if __name__ == "__main__":
+    main()
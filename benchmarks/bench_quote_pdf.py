@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark de generación de cotizaciones en PDF.
+
+Mide documentos por segundo generando un lote sintético en serie y en
+paralelo hacia un ZIP temporal en disco.
+
+Uso:
+    python benchmarks/bench_quote_pdf.py [--quotes 200] [--workers 4]
+"""
+
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from quote_pdf import PARALLEL_THRESHOLD, make_executor, write_quotes_zip  # noqa: E402
+
+def _thumbnail():
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.new("RGB", (400, 300), (78, 205, 196)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+def _quotes(count):
+    quotes = []
+    for i in range(count):
+        quotes.append({
+            'id': f"{i:08x}",
+            'timestamp': datetime.now().isoformat(),
+            'model': {
+                'filename': f"pieza_{i}.stl",
+                'volume_mm3': 12500.0 + i,
+                'volume_cm3': 12.5 + i / 1000,
+                'dimensions_mm': [40.0, 25.0, 12.5],
+                'bounds': [[0, 0, 0], [40.0, 25.0, 12.5]],
+                'file_size': 84 + 50 * 2400,
+                'vertices_count': 1202,
+                'faces_count': 2400,
+                'is_watertight': True,
+                'analysis_method': 'trimesh/cadquery'
+            },
+            'calculations': {
+                'final_price': 18.2, 'currency': '€', 'material': 'PLA', 'density': 1.24,
+                'infill': 20, 'layer_height': 0.2, 'supports': False, 'weight_grams': 3.1,
+                'estimated_hours': 1.56, 'material_cost': 0.08, 'labor_cost': 23.4,
+                'profit_margin': 30, 'profit': 7.04
+            }
+        })
+    return quotes
+
+def _run(quotes, thumbnails, executor):
+    with tempfile.TemporaryFile() as zip_file:
+        t0 = time.perf_counter()
+        count = write_quotes_zip(quotes, zip_file, thumbnails=thumbnails, executor=executor)
+        elapsed = time.perf_counter() - t0
+        size = zip_file.tell()
+    return count, elapsed, size
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--quotes", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    quotes = _quotes(args.quotes)
+    thumbnail = _thumbnail()
+    thumbnails = {quote['id']: thumbnail for quote in quotes}
+
+    executor = make_executor(args.workers)
+    # El arranque de los procesos se paga una vez por servidor, no por lote
+    _run(quotes[:max(PARALLEL_THRESHOLD, executor._max_workers * 2)], thumbnails, executor)
+
+    for label, pool in (("serie", None), ("paralelo", executor)):
+        count, elapsed, size = _run(quotes, thumbnails, pool)
+        print(f"{label:<9} {count} PDF en {elapsed:.2f} s  "
+              f"{count / elapsed:7.1f} docs/s  ZIP {size / 1024:.0f} KiB")
+
+    executor.shutdown()
+
+if __name__ == "__main__":
+    main()
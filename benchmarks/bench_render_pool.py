@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark del pool de render con muchas sesiones concurrentes.
+
+Cada sesión virtual es un hilo que pide renders de la misma escena al pool,
+como lo haría el hilo del script de Streamlit. Se reporta el throughput
+total, las latencias y los rechazos por back-pressure.
+
+Uso:
+    python benchmarks/bench_render_pool.py [--sessions 24] [--renders 5] [--workers 4]
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from render_pool import RenderPool, RenderPoolBusy, publish_mesh  # noqa: E402
+
+def _sphere(subdivisions):
+    """Mesh de prueba sin depender de archivos externos"""
+    import trimesh
+    mesh = trimesh.creation.icosphere(subdivisions=subdivisions, radius=20.0)
+    return mesh.vertices, mesh.faces
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sessions", type=int, default=24)
+    parser.add_argument("--renders", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--max-queue", type=int, default=32)
+    parser.add_argument("--subdivisions", type=int, default=5)
+    args = parser.parse_args()
+
+    vertices, faces = _sphere(args.subdivisions)
+    scene = {
+        'mesh_key': publish_mesh(vertices, faces),
+        'model_color': "#4ECDC4",
+        'background_color': "#1E1E1E",
+        'wireframe': False,
+        'show_axes': True,
+        'show_grid': False,
+        'vertex_colors': None,
+        'window_size': (800, 600)
+    }
+
+    pool = RenderPool(workers=args.workers, max_queue=args.max_queue)
+    pool.render(scene)  # calentar: arranque de Xvfb e importación de VTK
+
+    latencies = []
+    counters = {'busy': 0, 'errors': 0}
+    lock = threading.Lock()
+
+    def session():
+        for _ in range(args.renders):
+            t0 = time.perf_counter()
+            try:
+                pool.render(scene)
+            except RenderPoolBusy:
+                with lock:
+                    counters['busy'] += 1
+                continue
+            except Exception:
+                with lock:
+                    counters['errors'] += 1
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - t0)
+
+    threads = [threading.Thread(target=session) for _ in range(args.sessions)]
+    t0 = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - t0
+    pool.close()
+
+    print(f"sesiones: {args.sessions}  renders/sesión: {args.renders}  caras: {len(faces)}")
+    print(f"ok: {len(latencies)}  ocupado: {counters['busy']}  errores: {counters['errors']}")
+    if latencies:
+        p50, p95 = np.percentile(latencies, [50, 95]) * 1000
+        print(f"throughput: {len(latencies) / elapsed:.1f} renders/s  p50 {p50:.0f} ms  p95 {p95:.0f} ms")
+
+if __name__ == "__main__":
+    main()
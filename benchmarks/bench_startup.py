@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark de arranque en frío del Cotizador 3D.
+
+Extrae ``Test.py`` (y los módulos que lo acompañan) de dos revisiones de git
+y, en un proceso Python nuevo por repetición, mide con ``AppTest``:
+
+- importar streamlit y el arnés de pruebas,
+- la primera ejecución del script (primera página de la primera sesión:
+  importaciones del script, Xvfb y demás inicialización por proceso),
+- la primera ejecución de una segunda sesión en el mismo proceso.
+
+Uso:
+    python benchmarks/bench_startup.py [--base <rev>] [--head HEAD] [--runs 5]
+"""
+
+import argparse
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_PROBE = r"""
+import json, sys, time
+t0 = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+t1 = time.perf_counter()
+first = AppTest.from_file(sys.argv[1], default_timeout=120).run()
+t2 = time.perf_counter()
+second = AppTest.from_file(sys.argv[1], default_timeout=120).run()
+t3 = time.perf_counter()
+errors = [e.value for e in list(first.exception) + list(second.exception)]
+print(json.dumps({'import': t1 - t0, 'first': t2 - t1, 'second': t3 - t2, 'errors': errors}))
+"""
+
+def _git(*args):
+    return subprocess.run(["git", *args], cwd=REPO_DIR, capture_output=True, check=True).stdout
+
+def _checkout(rev, target):
+    """Extrae el árbol de la revisión en ``target`` sin tocar el repositorio"""
+    with tarfile.open(fileobj=io.BytesIO(_git("archive", rev)), mode="r:") as archive:
+        archive.extractall(target)
+
+def _measure(script_dir):
+    out = subprocess.run([sys.executable, "-c", _PROBE, os.path.join(script_dir, "Test.py")],
+                         cwd=script_dir, capture_output=True, text=True)
+    lines = out.stdout.strip().splitlines()
+    if out.returncode != 0 or not lines:
+        raise RuntimeError(out.stderr.strip().splitlines()[-1] if out.stderr.strip() else "sin salida")
+    return json.loads(lines[-1])
+
+def main():
+    root = _git("rev-list", "--max-parents=0", "HEAD").decode().split()[0]
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--base", default=root, help="revisión de referencia (por defecto la inicial)")
+    parser.add_argument("--head", default="HEAD")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'revisión':<12} {'import st':>10} {'1ª sesión':>10} {'2ª sesión':>10}")
+    for rev in (args.base, args.head):
+        label = _git("rev-parse", "--short", rev).decode().strip()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            _checkout(rev, tmp_dir)
+            try:
+                samples = [_measure(tmp_dir) for _ in range(args.runs)]
+            except RuntimeError as e:
+                print(f"{label:<12} no se pudo ejecutar: {e}")
+                continue
+
+        median = {key: statistics.median(s[key] for s in samples) * 1000
+                  for key in ('import', 'first', 'second')}
+        note = "  (incompleta: la app lanzó excepciones)" if samples[0]['errors'] else ""
+        print(f"{label:<12} {median['import']:>7.0f} ms {median['first']:>7.0f} ms "
+              f"{median['second']:>7.0f} ms{note}")
+        for error in sorted(set(samples[0]['errors']))[:3]:
+            print(f"{'':<12} excepción en la app: {error}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+Comprobación del volumen que se cotiza para un STL completo.
+
+El volumen del conjunto es la suma de los cuerpos de split_bodies con sus
+huecos internos descontados, así que un cambio en mesh_bodies cambia el
+precio de todas las cotizaciones. Este script carga STL sintéticos por el
+mismo camino que la app (``ModelVisualizer3D.load_stl_from_bytes``) y
+compara volumen, número de cuerpos y precio con los valores esperados:
+
+- caja hueca: se cotiza el volumen de las paredes,
+- caja con las normales invertidas: cuenta como un cuerpo positivo,
+- dos cajas separadas: se suman.
+
+Termina con código 1 si algún caso no coincide.
+
+Uso:
+    python benchmarks/check_volumes.py
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Test import ModelVisualizer3D, calculate_costs  # noqa: E402
+
+# PLA, 20 % de relleno, capa 0.2 mm, sin soportes, 25 €/kg, 15 €/h, 30 % de margen
+PRICING = (1.24, 20, 0.2, False, 25.0, 15.0, 30)
+
+def _stl(*meshes):
+    import trimesh
+    return trimesh.util.concatenate(meshes).export(file_type='stl')
+
+def _cases():
+    import trimesh
+
+    cube = trimesh.creation.box((100, 100, 100))
+    void = trimesh.creation.box((80, 80, 80))
+    void.invert()
+    inverted = cube.copy()
+    inverted.invert()
+    small = trimesh.creation.box((50, 50, 50))
+    small.apply_translation((200, 0, 0))
+
+    # (nombre, bytes del STL, volumen esperado en cm³, cuerpos esperados)
+    return [
+        ("caja hueca de 100 mm con hueco de 80 mm", _stl(cube, void), 1000.0 - 512.0, 1),
+        ("caja de 100 mm con normales invertidas", _stl(inverted), 1000.0, 1),
+        ("cajas separadas de 100 y 50 mm", _stl(cube, small), 1000.0 + 125.0, 2),
+    ]
+
+def main():
+    failures = 0
+    for name, stl_bytes, expected_cm3, expected_bodies in _cases():
+        visualizer = ModelVisualizer3D()
+        if not visualizer.load_stl_from_bytes(stl_bytes, f"{name}.stl"):
+            print(f"FALLA  {name}: no se pudo cargar")
+            failures += 1
+            continue
+
+        info = visualizer.get_model_info()
+        price = calculate_costs(info['volume_cm3'], *PRICING)['final_price']
+        expected_price = calculate_costs(expected_cm3, *PRICING)['final_price']
+
+        ok = (abs(info['volume_cm3'] - expected_cm3) < 1e-6
+              and info['bodies_count'] == expected_bodies
+              and abs(price - expected_price) < 1e-6)
+        failures += not ok
+        print(f"{'ok    ' if ok else 'FALLA '} {name}: {info['volume_cm3']:.1f} cm³ "
+              f"(esperado {expected_cm3:.1f}), {info['bodies_count']} cuerpos "
+              f"(esperado {expected_bodies}), precio {price:.2f} (esperado {expected_price:.2f})")
+
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
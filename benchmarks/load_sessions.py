@@ -0,0 +1,464 @@
+# -*- coding: utf-8 -*-
+"""
+Prueba de carga con sesiones concurrentes del Cotizador 3D.
+
+Arranca la app con ``streamlit run`` en local (sin red externa) y la maneja
+como lo haría el navegador: cada usuario virtual abre su propio websocket,
+sube un STL por ``stl_uploader``, mueve los sliders de la cotización, genera
+la cotización, abre la vista 3D y exporta el modelo. Se mide la latencia de
+cada interacción (hasta que el script termina), los errores y el RSS pico
+del servidor junto con sus procesos hijos (workers de render y de PDF).
+
+Para cada nivel de concurrencia se arranca un servidor nuevo, de modo que el
+resultado es una curva de capacidad. Se guarda en JSON para compararla con
+otra ejecución mediante ``--baseline``.
+
+Uso:
+    python benchmarks/load_sessions.py --users 1,5,10,20 --out carga.json
+    python benchmarks/load_sessions.py --users 1,5,10,20 --baseline carga.json
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+from uuid import uuid4
+
+import numpy as np
+from tornado.httpclient import AsyncHTTPClient, HTTPRequest
+from tornado.websocket import websocket_connect
+
+from streamlit.proto.Alert_pb2 import Alert
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_SCRIPT = os.path.join(REPO_DIR, "Test.py")
+
+STEPS = ["abrir", "subir_stl", "relleno", "capa", "margen", "cotizar", "vista_3d", "exportar"]
+
+
+# --- Servidor --------------------------------------------------------------
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_server(port, startup_timeout=60):
+    """Arranca la app en modo headless y espera a que responda"""
+    cmd = [
+        sys.executable, "-m", "streamlit", "run", APP_SCRIPT,
+        "--server.headless", "true",
+        "--server.address", "127.0.0.1",
+        "--server.port", str(port),
+        "--server.enableXsrfProtection", "false",
+        "--server.fileWatcherType", "none",
+        "--browser.gatherUsageStats", "false",
+    ]
+    proc = subprocess.Popen(cmd, cwd=REPO_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+    import urllib.request
+    deadline = time.monotonic() + startup_timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"streamlit terminó al arrancar:\n{proc.stderr.read().decode()[-2000:]}")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1) as resp:
+                if resp.status == 200:
+                    return proc
+        except OSError:
+            time.sleep(0.2)
+
+    proc.kill()
+    raise RuntimeError("streamlit no respondió a tiempo")
+
+def stop_server(proc):
+    proc.terminate()
+    try:
+        proc.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+
+# --- RSS del servidor y sus hijos (Linux /proc) ----------------------------
+
+def _rss_tree_kb(root_pid):
+    """Suma VmRSS del proceso y todos sus descendientes"""
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as stat_file:
+                ppid = int(stat_file.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+
+    total = 0
+    stack = [root_pid]
+    while stack:
+        pid = stack.pop()
+        stack.extend(children.get(pid, []))
+        try:
+            with open(f"/proc/{pid}/status") as status_file:
+                for line in status_file:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1])
+                        break
+        except OSError:
+            pass
+    return total
+
+class RssSampler(threading.Thread):
+    """Muestrea el RSS del árbol de procesos del servidor en segundo plano"""
+
+    def __init__(self, pid, interval=0.25):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.peak_kb = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self.peak_kb = max(self.peak_kb, _rss_tree_kb(self.pid))
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+# --- Usuario virtual -------------------------------------------------------
+
+class VirtualUser:
+    """Una sesión de navegador simulada sobre el protocolo websocket de Streamlit"""
+
+    def __init__(self, port, stl_bytes, timeout):
+        self.port = port
+        self.stl_bytes = stl_bytes
+        self.timeout = timeout
+        self.ws = None
+        self.session_id = None
+        self.widgets = {}
+        self.states = {}
+        self.run_errors = []
+        self._finished = None
+        self._file_urls = {}
+        self._reader = None
+
+    async def connect(self):
+        self.ws = await websocket_connect(f"ws://127.0.0.1:{self.port}/_stcore/stream",
+                                          max_message_size=64 * 1024 * 1024)
+        self._reader = asyncio.ensure_future(self._read_loop())
+
+    async def close(self):
+        if self.ws is not None:
+            self.ws.close()
+        if self._reader is not None:
+            self._reader.cancel()
+
+    async def _read_loop(self):
+        while True:
+            data = await self.ws.read_message()
+            if data is None:
+                if self._finished and not self._finished.done():
+                    self._finished.set_exception(ConnectionError("websocket cerrado"))
+                return
+            msg = ForwardMsg()
+            msg.ParseFromString(data)
+            self._dispatch(msg)
+
+    def _dispatch(self, msg):
+        kind = msg.WhichOneof("type")
+
+        if kind == "new_session":
+            self.session_id = msg.new_session.initialize.session_id
+
+        elif kind == "delta" and msg.delta.WhichOneof("type") == "new_element":
+            element = msg.delta.new_element
+            element_kind = element.WhichOneof("type")
+            if element_kind is None:
+                return
+            proto = getattr(element, element_kind)
+
+            widget_id = getattr(proto, "id", "")
+            if isinstance(widget_id, str) and widget_id.startswith("$$ID-"):
+                self.widgets[widget_id.split("-", 2)[2]] = widget_id
+
+            if element_kind == "exception":
+                self.run_errors.append(f"{proto.type}: {proto.message}")
+            elif element_kind == "alert" and proto.format == Alert.ERROR:
+                self.run_errors.append(proto.body)
+
+        elif kind == "script_finished":
+            status = msg.script_finished
+            if status == ForwardMsg.FINISHED_WITH_COMPILE_ERROR:
+                self.run_errors.append("error de compilación del script")
+            if status != ForwardMsg.FINISHED_EARLY_FOR_RERUN and self._finished and not self._finished.done():
+                self._finished.set_result(status)
+
+        elif kind == "file_urls_response":
+            future = self._file_urls.pop(msg.file_urls_response.response_id, None)
+            if future is not None and not future.done():
+                future.set_result(msg.file_urls_response.file_urls[0])
+
+    async def _send(self, back_msg):
+        await self.ws.write_message(back_msg.SerializeToString(), binary=True)
+
+    async def rerun(self, trigger=None):
+        """Envía el estado de los widgets y espera a que el script termine"""
+        back_msg = BackMsg()
+        back_msg.rerun_script.SetInParent()
+        widget_states = back_msg.rerun_script.widget_states
+        for state in self.states.values():
+            widget_states.widgets.append(state)
+
+        if trigger is not None:
+            widget_states.widgets.append(WidgetState(id=self._widget_id(trigger), trigger_value=True))
+
+        self.run_errors = []
+        self._finished = asyncio.get_running_loop().create_future()
+        await self._send(back_msg)
+        await asyncio.wait_for(self._finished, self.timeout)
+
+        if self.run_errors:
+            raise RuntimeError(self.run_errors[0])
+
+    def _widget_id(self, key):
+        if key not in self.widgets:
+            raise RuntimeError(f"widget '{key}' no encontrado")
+        return self.widgets[key]
+
+    def set_slider(self, key, value):
+        state = WidgetState(id=self._widget_id(key))
+        state.double_array_value.data.append(value)
+        self.states[key] = state
+
+    async def upload(self, key, filename):
+        """Sube el archivo como lo hace el frontend y lo asigna al uploader"""
+        request_id = uuid4().hex
+        future = asyncio.get_running_loop().create_future()
+        self._file_urls[request_id] = future
+
+        back_msg = BackMsg()
+        back_msg.file_urls_request.request_id = request_id
+        back_msg.file_urls_request.session_id = self.session_id
+        back_msg.file_urls_request.file_names.append(filename)
+        await self._send(back_msg)
+        file_urls = await asyncio.wait_for(future, self.timeout)
+
+        boundary = uuid4().hex
+        body = (
+            f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+            f"Content-Type: application/octet-stream\r\n\r\n"
+        ).encode() + self.stl_bytes + f"\r\n--{boundary}--\r\n".encode()
+
+        await AsyncHTTPClient().fetch(HTTPRequest(
+            f"http://127.0.0.1:{self.port}{file_urls.upload_url}",
+            method="PUT",
+            headers={"Content-Type": f"multipart/form-data; boundary={boundary}"},
+            body=body,
+            request_timeout=self.timeout
+        ))
+
+        state = WidgetState(id=self._widget_id(key))
+        info = state.file_uploader_state_value.uploaded_file_info.add()
+        info.file_id = file_urls.file_id
+        info.name = filename
+        info.size = len(self.stl_bytes)
+        info.file_urls.CopyFrom(file_urls)
+        self.states[key] = state
+
+        await self.rerun()
+
+
+async def _session(port, stl_bytes, timeout, think_time, samples, errors):
+    """Guion de una sesión realista de cotización"""
+    user = VirtualUser(port, stl_bytes, timeout)
+
+    async def step(name, action):
+        t0 = time.perf_counter()
+        try:
+            await action()
+        except Exception as e:
+            errors.append({'step': name, 'error': f"{type(e).__name__}: {e}"[:300]})
+            return False
+        samples[name].append(time.perf_counter() - t0)
+        await asyncio.sleep(think_time * random.uniform(0.5, 1.5))
+        return True
+
+    async def open_app():
+        await user.connect()
+        await user.rerun()
+
+    async def slider(key, value):
+        user.set_slider(key, value)
+        await user.rerun()
+
+    try:
+        if not await step("abrir", open_app):
+            return
+        if not await step("subir_stl", lambda: user.upload("stl_uploader", "pieza.stl")):
+            return
+        await step("relleno", lambda: slider("infill_slider", 40))
+        await step("capa", lambda: slider("layer_height_slider", 1))  # índice de 0.12 mm
+        await step("margen", lambda: slider("profit_margin_slider", 40))
+        await step("cotizar", lambda: user.rerun(trigger="generate_quotation_btn"))
+        await step("vista_3d", lambda: user.rerun(trigger="nav_viz"))
+        await step("exportar", lambda: user.rerun(trigger="export_model_btn"))
+    finally:
+        await user.close()
+
+
+# --- Ejecución por niveles -------------------------------------------------
+
+def _percentiles(values):
+    if not values:
+        return None
+    p50, p90, p95, p99 = np.percentile(values, [50, 90, 95, 99]) * 1000
+    return {'count': len(values), 'p50_ms': round(p50, 1), 'p90_ms': round(p90, 1),
+            'p95_ms': round(p95, 1), 'p99_ms': round(p99, 1),
+            'max_ms': round(max(values) * 1000, 1)}
+
+def run_level(users, stl_bytes, args):
+    """Corre ``users`` sesiones concurrentes contra un servidor recién arrancado"""
+    port = _free_port()
+    server = start_server(port)
+    sampler = RssSampler(server.pid)
+    sampler.start()
+
+    samples = {name: [] for name in STEPS}
+    errors = []
+
+    async def run_all():
+        tasks = []
+        for _ in range(users):
+            tasks.append(asyncio.ensure_future(
+                _session(port, stl_bytes, args.timeout, args.think, samples, errors)))
+            await asyncio.sleep(args.ramp / max(users, 1))
+        await asyncio.gather(*tasks)
+
+    t0 = time.perf_counter()
+    try:
+        asyncio.run(run_all())
+    finally:
+        elapsed = time.perf_counter() - t0
+        sampler.stop()
+        stop_server(server)
+
+    completed = len(samples["exportar"])
+    return {
+        'users': users,
+        'duration_s': round(elapsed, 2),
+        'sessions_completed': completed,
+        'interactions_per_s': round(sum(len(v) for v in samples.values()) / elapsed, 2),
+        'errors': len(errors),
+        'error_samples': errors[:10],
+        'peak_rss_mb': round(sampler.peak_kb / 1024, 1),
+        'steps': {name: _percentiles(values) for name, values in samples.items()}
+    }
+
+def _sample_stl(subdivisions):
+    import trimesh
+    buffer = io.BytesIO()
+    trimesh.creation.icosphere(subdivisions=subdivisions, radius=20.0).export(buffer, file_type='stl')
+    return buffer.getvalue()
+
+
+# --- Reporte ---------------------------------------------------------------
+
+def print_report(result, baseline=None):
+    base_levels = {level['users']: level for level in (baseline or {}).get('levels', [])}
+
+    header = f"{'usuarios':>8} {'ok':>5} {'errores':>7} {'RSS pico':>10} {'int/s':>7}"
+    for name in STEPS:
+        header += f" {name + ' p95':>14}"
+    print(header)
+
+    for level in result['levels']:
+        line = (f"{level['users']:>8} {level['sessions_completed']:>5} {level['errors']:>7} "
+                f"{level['peak_rss_mb']:>7.0f} MB {level['interactions_per_s']:>7.2f}")
+        for name in STEPS:
+            stats = level['steps'][name]
+            cell = f"{stats['p95_ms']:.0f} ms" if stats else "-"
+            line += f" {cell:>14}"
+        print(line)
+
+        base = base_levels.get(level['users'])
+        if base:
+            delta = f"{'Δ base':>8} {'':>5} {level['errors'] - base['errors']:>+7} " \
+                    f"{level['peak_rss_mb'] - base['peak_rss_mb']:>+7.0f} MB " \
+                    f"{level['interactions_per_s'] - base['interactions_per_s']:>+7.2f}"
+            for name in STEPS:
+                stats, base_stats = level['steps'][name], base['steps'].get(name)
+                if stats and base_stats:
+                    change = f"{(stats['p95_ms'] / base_stats['p95_ms'] - 1) * 100:+.0f}%"
+                    delta += f" {change:>14}"
+                else:
+                    delta += f" {'-':>14}"
+            print(delta)
+
+    for level in result['levels']:
+        for error in level['error_samples'][:3]:
+            print(f"[{level['users']} usuarios] {error['step']}: {error['error']}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", default="1,5,10,20",
+                        help="niveles de concurrencia separados por comas")
+    parser.add_argument("--stl", help="STL a subir (por defecto una esfera generada)")
+    parser.add_argument("--subdivisions", type=int, default=5,
+                        help="detalle de la esfera generada si no se da --stl")
+    parser.add_argument("--think", type=float, default=0.5,
+                        help="pausa media entre interacciones (s)")
+    parser.add_argument("--ramp", type=float, default=2.0,
+                        help="tiempo para incorporar a todos los usuarios (s)")
+    parser.add_argument("--timeout", type=float, default=60.0,
+                        help="timeout por interacción (s)")
+    parser.add_argument("--out", help="guardar el resultado en JSON")
+    parser.add_argument("--baseline", help="JSON de una ejecución anterior para comparar")
+    args = parser.parse_args()
+
+    if args.stl:
+        with open(args.stl, 'rb') as stl_file:
+            stl_bytes = stl_file.read()
+    else:
+        stl_bytes = _sample_stl(args.subdivisions)
+
+    result = {
+        'timestamp': datetime.now().isoformat(),
+        'stl_bytes': len(stl_bytes),
+        'think_s': args.think,
+        'levels': []
+    }
+    for users in (int(n) for n in args.users.split(",")):
+        print(f"→ {users} usuarios...", flush=True)
+        result['levels'].append(run_level(users, stl_bytes, args))
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+
+    print_report(result, baseline)
+
+    if args.out:
+        with open(args.out, 'w') as out_file:
+            json.dump(result, out_file, indent=2, ensure_ascii=False)
+
+if __name__ == "__main__":
+    main()
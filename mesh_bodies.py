@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+"""
+Detección de cuerpos separados dentro de un mismo STL.
+
+Las caras se etiquetan por componentes conexas del grafo de adyacencia por
+aristas (dos caras están conectadas si comparten una arista) usando
+``scipy.sparse.csgraph``; las métricas de cada cuerpo se agregan con
+operaciones vectorizadas de numpy, sin bucles de Python por cara ni por
+cuerpo.
+
+Un cuerpo cerrado con volumen negativo (normales hacia dentro) dentro de otro
+cuerpo cerrado es un hueco interno: su volumen se resta del cuerpo que lo
+encierra. Para encontrarlo se lanza un rayo desde cada hueco y se cuentan por
+paridad sus cruces con las caras de cada cuerpo. Las caras se reparten en una
+rejilla perpendicular al rayo, así cada punto solo se prueba contra las pocas
+caras cuya sombra lo cubre, y todos los huecos y cuerpos se resuelven en una
+sola pasada vectorizada.
+"""
+
+import numpy as np
+
+# Dirección fija y "rara" para los rayos, así es improbable que pasen justo
+# por una arista o un vértice de mallas alineadas con los ejes
+_RAY = np.array([0.8191520, 0.4924039, 0.2940403])
+
+# Base del plano perpendicular al rayo, para proyectar puntos y caras
+_RAY_PLANE = np.array([np.cross(_RAY, [0.0, 0.0, 1.0]),
+                       np.cross(_RAY, np.cross(_RAY, [0.0, 0.0, 1.0]))])
+_RAY_PLANE /= np.linalg.norm(_RAY_PLANE, axis=1, keepdims=True)
+
+
+def label_faces(faces):
+    """Etiqueta cada cara con el índice de su cuerpo
+
+    Devuelve ``(labels, edge_ids, edge_counts)``: la etiqueta por cara, el id
+    de arista única de cada una de las 3 aristas de cada cara (forma (F, 3))
+    y cuántas caras usan cada arista única.
+    """
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import connected_components
+
+    faces = np.asarray(faces, dtype=np.int64)
+    n_faces = len(faces)
+
+    # Aristas sin orientación, codificadas en un único entero
+    edges = np.sort(faces[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2), axis=1)
+    edge_keys = edges[:, 0] * (int(faces.max()) + 1) + edges[:, 1]
+    unique_keys, edge_ids = np.unique(edge_keys, return_inverse=True)
+    edge_ids = edge_ids.reshape(-1)
+    edge_counts = np.bincount(edge_ids, minlength=len(unique_keys))
+
+    # Grafo bipartito cara–arista: caras que comparten arista quedan conectadas
+    rows = np.repeat(np.arange(n_faces), 3)
+    cols = n_faces + edge_ids
+    size = n_faces + len(unique_keys)
+    graph = coo_matrix((np.ones(len(rows), dtype=np.int8), (rows, cols)), shape=(size, size))
+
+    _, labels = connected_components(graph, directed=False)
+
+    # Renumerar para que las etiquetas de las caras sean 0..n_cuerpos-1
+    _, face_labels = np.unique(labels[:n_faces], return_inverse=True)
+
+    return face_labels.reshape(-1), edge_ids.reshape(n_faces, 3), edge_counts
+
+def _expand_ranges(starts, counts):
+    """Concatena los rangos [start, start + count) sin bucles de Python"""
+    offsets = np.repeat(np.cumsum(counts) - counts, counts)
+    return np.repeat(starts, counts) + np.arange(int(counts.sum())) - offsets
+
+def _ray_hits(origins, triangles):
+    """Möller–Trumbore por pares: ¿el rayo desde cada origen cruza su triángulo?"""
+    edge1 = triangles[:, 1] - triangles[:, 0]
+    edge2 = triangles[:, 2] - triangles[:, 0]
+    h = np.cross(_RAY, edge2)
+    det = np.einsum('ij,ij->i', edge1, h)
+    parallel = np.abs(det) < 1e-12
+    inv_det = 1.0 / np.where(parallel, 1.0, det)
+
+    s = origins - triangles[:, 0]
+    u = np.einsum('ij,ij->i', s, h) * inv_det
+    q = np.cross(s, edge1)
+    v = (q @ _RAY) * inv_det
+    t = np.einsum('ij,ij->i', q, edge2) * inv_det
+
+    return ~parallel & (u >= 0) & (v >= 0) & (u + v <= 1) & (t > 0)
+
+def _crossings(points, triangles):
+    """Pares (punto, cara) en los que el rayo desde el punto cruza la cara
+
+    Un rayo solo puede cruzar las caras cuya proyección sobre el plano
+    perpendicular a él contiene la del punto, así que las caras se agrupan en
+    una rejilla de ese plano y cada punto se prueba solo contra las de su
+    celda.
+    """
+    empty = np.zeros(0, dtype=np.int64)
+    if len(points) == 0 or len(triangles) == 0:
+        return empty, empty
+
+    flat = triangles @ _RAY_PLANE.T
+    low, high = flat.min(axis=1), flat.max(axis=1)
+    origin = low.min(axis=0)
+    extent = high.max(axis=0) - origin
+    cells = max(1, int(np.sqrt(len(triangles))))
+    cell_size = np.maximum(extent / cells, 1e-12)
+
+    # Celdas que cubre la caja proyectada de cada cara, como pares (celda, cara)
+    first = np.clip(((low - origin) // cell_size).astype(np.int64), 0, cells - 1)
+    last = np.clip(((high - origin) // cell_size).astype(np.int64), 0, cells - 1)
+    span = last - first + 1
+    covered = span[:, 0] * span[:, 1]
+    face_ids = np.repeat(np.arange(len(triangles)), covered)
+    local = _expand_ranges(np.zeros(len(triangles), dtype=np.int64), covered)
+    cell_ids = ((first[face_ids, 0] + local // span[face_ids, 1]) * cells
+                + first[face_ids, 1] + local % span[face_ids, 1])
+    order = np.argsort(cell_ids, kind='stable')
+    cell_ids, face_ids = cell_ids[order], face_ids[order]
+
+    # Caras de la celda de cada punto; fuera de la rejilla el rayo no cruza nada
+    projected = points @ _RAY_PLANE.T
+    in_grid = ((projected >= origin) & (projected <= origin + extent)).all(axis=1)
+    point_cells = np.clip(((projected - origin) // cell_size).astype(np.int64), 0, cells - 1)
+    point_cells = point_cells[:, 0] * cells + point_cells[:, 1]
+    starts = np.searchsorted(cell_ids, point_cells, side='left')
+    counts = np.where(in_grid, np.searchsorted(cell_ids, point_cells, side='right') - starts, 0)
+
+    pair_points = np.repeat(np.arange(len(points)), counts)
+    pair_faces = face_ids[_expand_ranges(starts, counts)]
+    hits = _ray_hits(points[pair_points], triangles[pair_faces])
+    return pair_points[hits], pair_faces[hits]
+
+def points_inside(points, triangles):
+    """Indica qué puntos (P, 3) quedan dentro de una malla cerrada (F, 3, 3)"""
+    points = np.asarray(points, dtype=np.float64)
+    triangles = np.asarray(triangles, dtype=np.float64)
+    pair_points, _ = _crossings(points, triangles)
+    return np.bincount(pair_points, minlength=len(points)) % 2 == 1
+
+def split_bodies(vertices, faces):
+    """Métricas por cuerpo de un mesh que puede contener varias piezas
+
+    Devuelve un dict de arrays indexados por cuerpo: ``volume_mm3``,
+    ``bounds`` (N, 2, 3), ``is_watertight``, ``faces_count``,
+    ``vertices_count`` y ``cavity_of``.
+
+    Los huecos internos (cuerpos cerrados con volumen negativo encerrados por
+    un cuerpo cerrado positivo) tienen en ``cavity_of`` el índice del cuerpo
+    que los encierra y conservan su volumen negativo, que ya va descontado
+    del volumen y sumado a las caras y vértices de ese cuerpo. Los demás
+    cuerpos tienen ``cavity_of == -1`` y volumen no negativo: los abiertos o
+    con las normales invertidas se cuentan por su valor absoluto.
+    """
+    vertices = np.asarray(vertices, dtype=np.float64)
+    faces = np.asarray(faces, dtype=np.int64)
+
+    if len(faces) == 0:
+        return {
+            'volume_mm3': np.zeros(0),
+            'bounds': np.zeros((0, 2, 3)),
+            'is_watertight': np.zeros(0, dtype=bool),
+            'faces_count': np.zeros(0, dtype=np.int64),
+            'vertices_count': np.zeros(0, dtype=np.int64),
+            'cavity_of': np.zeros(0, dtype=np.int64)
+        }
+
+    labels, edge_ids, edge_counts = label_faces(faces)
+    n_bodies = int(labels.max()) + 1
+
+    # Volumen con signo por teorema de la divergencia, sumado por cuerpo
+    v0, v1, v2 = vertices[faces[:, 0]], vertices[faces[:, 1]], vertices[faces[:, 2]]
+    face_volumes = np.einsum('ij,ij->i', v0, np.cross(v1, v2)) / 6.0
+    volume = np.bincount(labels, weights=face_volumes, minlength=n_bodies)
+
+    # Cerrado si cada arista del cuerpo la comparten exactamente dos caras
+    open_edges = (edge_counts[edge_ids] != 2).sum(axis=1)
+    is_watertight = np.bincount(labels, weights=open_edges, minlength=n_bodies) == 0
+
+    # Límites: ordenar las esquinas de las caras por cuerpo y reducir por tramos
+    corner_labels = np.repeat(labels, 3)
+    order = np.argsort(corner_labels, kind='stable')
+    corners = vertices[faces.reshape(-1)[order]]
+    starts = np.searchsorted(corner_labels[order], np.arange(n_bodies))
+    bounds = np.stack([np.minimum.reduceat(corners, starts, axis=0),
+                       np.maximum.reduceat(corners, starts, axis=0)], axis=1)
+
+    # Huecos internos: cuerpo cerrado negativo dentro de un cuerpo cerrado positivo
+    face_order = np.argsort(labels, kind='stable')
+    face_starts = np.searchsorted(labels[face_order], np.arange(n_bodies + 1))
+    cavity_of = _enclosing_bodies(vertices, faces, volume, bounds, is_watertight,
+                                  face_order, face_starts)
+    is_cavity = cavity_of >= 0
+
+    faces_count = np.bincount(labels, minlength=n_bodies)
+    # Vértices distintos por cuerpo: pares (cuerpo, vértice) únicos
+    body_vertices = np.unique(corner_labels * len(vertices) + faces.reshape(-1))
+    vertices_count = np.bincount(body_vertices // len(vertices), minlength=n_bodies)
+    net_volume = volume.copy()
+    np.add.at(net_volume, cavity_of[is_cavity], volume[is_cavity])
+    np.add.at(faces_count, cavity_of[is_cavity], faces_count[is_cavity])
+    np.add.at(vertices_count, cavity_of[is_cavity], vertices_count[is_cavity])
+    net_volume[~is_cavity] = np.abs(net_volume[~is_cavity])
+
+    return {
+        'volume_mm3': net_volume,
+        'bounds': bounds,
+        'is_watertight': is_watertight,
+        'faces_count': faces_count,
+        'vertices_count': vertices_count,
+        'cavity_of': cavity_of
+    }
+
+def _enclosing_bodies(vertices, faces, volume, bounds, is_watertight, face_order, face_starts):
+    """Para cada cuerpo, índice del cuerpo que lo encierra si es un hueco, o -1"""
+    cavity_of = np.full(len(volume), -1, dtype=np.int64)
+    solids = np.flatnonzero(is_watertight & (volume > 0))
+    candidates = np.flatnonzero(is_watertight & (volume < 0))
+    if len(solids) == 0 or len(candidates) == 0:
+        return cavity_of
+
+    # Un vértice de cada candidato basta: las piezas no se cortan entre sí
+    probes = vertices[faces[face_order[face_starts[candidates]], 0]]
+
+    # Todas las caras de los sólidos, sabiendo a qué sólido pertenece cada una
+    counts = face_starts[solids + 1] - face_starts[solids]
+    solid_faces = face_order[_expand_ranges(face_starts[solids], counts)]
+    face_solid = np.repeat(np.arange(len(solids)), counts)
+
+    # Cruces por par (hueco, sólido): un número impar significa que lo encierra
+    pair_points, pair_faces = _crossings(probes, vertices[faces[solid_faces]])
+    keys, crossings = np.unique(pair_points * len(solids) + face_solid[pair_faces],
+                                return_counts=True)
+    keys = keys[crossings % 2 == 1]
+    holes, owners = keys // len(solids), keys % len(solids)
+
+    # La caja del sólido debe contener la del hueco entero, no solo su vértice
+    fits = ((bounds[solids[owners], 0] <= bounds[candidates[holes], 0]).all(axis=1)
+            & (bounds[solids[owners], 1] >= bounds[candidates[holes], 1]).all(axis=1))
+    holes, owners = holes[fits], owners[fits]
+
+    # Con sólidos anidados, el hueco pertenece al más pequeño que lo encierra
+    order = np.lexsort((volume[solids[owners]], holes))
+    holes, owners = holes[order], owners[order]
+    _, first = np.unique(holes, return_index=True)
+    cavity_of[candidates[holes[first]]] = solids[owners[first]]
+
+    return cavity_of
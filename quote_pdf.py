@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+"""
+Generación de cotizaciones en PDF para el Cotizador 3D.
+
+Un PDF por cotización con especificaciones, desglose de costos y miniatura
+del modelo. Los lotes grandes se generan en paralelo en procesos aparte y se
+escriben en un ZIP a medida que cada documento está listo, así al generarlos
+nunca se mantienen todos los PDF sin comprimir en memoria a la vez (el botón
+de descarga de Streamlit sí carga después el ZIP completo).
+"""
+
+import atexit
+import io
+import os
+import tempfile
+import threading
+import zipfile
+import multiprocessing as mp
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+from functools import lru_cache
+
+from fpdf import FPDF
+
+# Por debajo de este tamaño de lote no compensa arrancar procesos
+PARALLEL_THRESHOLD = 16
+
+BRAND_COLOR = (78, 205, 196)  # "#4ECDC4", primaryColor de config.toml
+
+
+def _txt(value):
+    """Adapta texto a las fuentes base de PDF (latin-1)"""
+    text = str(value).replace("€", "EUR")
+    return text.encode("latin-1", "replace").decode("latin-1")
+
+
+# --- Recursos compartidos entre documentos ---------------------------------
+
+@lru_cache(maxsize=None)
+def _logo_path():
+    """Dibuja el logo una vez por proceso y devuelve la ruta del PNG"""
+    from PIL import Image, ImageDraw
+
+    image = Image.new("RGB", (240, 240), BRAND_COLOR)
+    draw = ImageDraw.Draw(image)
+    draw.polygon([(120, 30), (210, 80), (210, 170), (120, 220), (30, 170), (30, 80)],
+                 outline=(30, 30, 30), width=12)
+    draw.line([(120, 120), (120, 220)], fill=(30, 30, 30), width=12)
+    draw.line([(120, 120), (30, 80)], fill=(30, 30, 30), width=12)
+    draw.line([(120, 120), (210, 80)], fill=(30, 30, 30), width=12)
+
+    fd, path = tempfile.mkstemp(prefix="cotizador3d_logo_", suffix=".png")
+    with os.fdopen(fd, "wb") as logo_file:
+        image.save(logo_file, format="PNG")
+    atexit.register(os.unlink, path)
+    return path
+
+
+_parsed_images = {}
+_parsed_images_lock = threading.Lock()
+
+
+class _QuotePDF(FPDF):
+    """FPDF que reutiliza el parseo de imágenes compartidas entre documentos"""
+
+    def _parsepng(self, name):
+        if name != _logo_path():
+            return FPDF._parsepng(self, name)
+
+        with _parsed_images_lock:
+            if name not in _parsed_images:
+                _parsed_images[name] = FPDF._parsepng(self, name)
+            # image() añade el índice 'i' propio de cada documento
+            return dict(_parsed_images[name])
+
+
+# --- Documento individual --------------------------------------------------
+
+def _write_thumbnail(thumbnail):
+    """Normaliza la miniatura a JPEG RGB en un archivo temporal
+
+    Devuelve la ruta y la relación alto/ancho de la imagen.
+    """
+    from PIL import Image
+
+    image = Image.open(io.BytesIO(thumbnail)).convert("RGB")
+    fd, path = tempfile.mkstemp(prefix="cotizador3d_thumb_", suffix=".jpg")
+    with os.fdopen(fd, "wb") as thumb_file:
+        image.save(thumb_file, format="JPEG", quality=85)
+    return path, image.height / image.width
+
+def _row(pdf, label, value):
+    pdf.set_font("Helvetica", "", 10)
+    pdf.cell(45, 7, _txt(label), border=0)
+    pdf.set_font("Helvetica", "B", 10)
+    pdf.cell(0, 7, _txt(value), border=0, ln=1)
+
+def quote_to_pdf(quote, thumbnail=None):
+    """Genera el PDF de una cotización y devuelve sus bytes
+
+    ``quote`` es el diccionario guardado en ``st.session_state['quotations']``;
+    ``thumbnail`` son los bytes PNG/JPEG de la miniatura, si existe.
+    """
+    model = quote['model']
+    calc = quote['calculations']
+    symbol = calc.get('currency', '$')
+
+    pdf = _QuotePDF(orientation="P", unit="mm", format="A4")
+    pdf.set_auto_page_break(True, margin=15)
+    pdf.add_page()
+
+    # Encabezado
+    pdf.image(_logo_path(), x=10, y=10, w=18)
+    pdf.set_xy(32, 11)
+    pdf.set_font("Helvetica", "B", 18)
+    pdf.cell(0, 8, _txt("Cotización de impresión 3D"), ln=1)
+    pdf.set_x(32)
+    pdf.set_font("Helvetica", "", 10)
+    date = datetime.fromisoformat(quote['timestamp']).strftime("%d/%m/%Y %H:%M")
+    pdf.cell(0, 6, _txt(f"Cotización {quote['id']}  -  {date}"), ln=1)
+    pdf.set_draw_color(*BRAND_COLOR)
+    pdf.set_line_width(0.8)
+    pdf.line(10, 32, 200, 32)
+
+    # Miniatura a la derecha de las especificaciones
+    thumb_path = None
+    if thumbnail:
+        try:
+            thumb_path, aspect = _write_thumbnail(thumbnail)
+            pdf.image(thumb_path, x=130, y=38, w=70)
+            if 'body' in model:
+                # La miniatura es del archivo completo, no solo del cuerpo cotizado
+                pdf.set_xy(130, 38 + 70 * aspect + 1)
+                pdf.set_font("Helvetica", "I", 8)
+                pdf.cell(70, 4, _txt(f"Vista del archivo completo ({model['bodies_count']} cuerpos)"),
+                         align="C")
+        except Exception:
+            pass
+        finally:
+            if thumb_path and os.path.exists(thumb_path):
+                os.unlink(thumb_path)
+
+    # Especificaciones
+    pdf.set_xy(10, 38)
+    pdf.set_font("Helvetica", "B", 12)
+    pdf.cell(0, 8, _txt("Especificaciones"), ln=1)
+
+    dim = model['dimensions_mm']
+    _row(pdf, "Archivo", model['filename'][:40])
+    if 'body' in model:
+        _row(pdf, "Cuerpo", f"{model['body']} de {model['bodies_count']}")
+    _row(pdf, "Volumen", f"{model['volume_cm3']:.2f} cm³")
+    _row(pdf, "Dimensiones", f"{dim[0]:.1f}×{dim[1]:.1f}×{dim[2]:.1f} mm")
+    _row(pdf, "Caras / vértices", f"{model['faces_count']} / {model['vertices_count']}")
+    _row(pdf, "Malla cerrada", "Sí" if model.get('is_watertight') else "No")
+    if 'material' in calc:
+        _row(pdf, "Material", calc['material'])
+        _row(pdf, "Relleno", f"{calc['infill']}%")
+        _row(pdf, "Altura de capa", f"{calc['layer_height']:.2f} mm")
+        _row(pdf, "Soportes", "Sí" if calc['supports'] else "No")
+        _row(pdf, "Peso", f"{calc['weight_grams']:.1f} g")
+        _row(pdf, "Tiempo estimado", f"{calc['estimated_hours']:.2f} h")
+
+    # Desglose de costos
+    pdf.set_xy(10, max(pdf.get_y(), 100) + 6)
+    pdf.set_font("Helvetica", "B", 12)
+    pdf.cell(0, 8, _txt("Costos"), ln=1)
+
+    if 'material_cost' in calc:
+        _row(pdf, "Material", f"{symbol} {calc['material_cost']:.2f}")
+        _row(pdf, "Mano de obra", f"{symbol} {calc['labor_cost']:.2f}")
+        _row(pdf, f"Margen ({calc['profit_margin']}%)", f"{symbol} {calc['profit']:.2f}")
+
+    pdf.ln(2)
+    pdf.set_fill_color(*BRAND_COLOR)
+    pdf.set_font("Helvetica", "B", 14)
+    pdf.cell(0, 11, _txt(f"  Total: {symbol} {calc['final_price']:.2f}"), ln=1, fill=True)
+
+    pdf.set_y(-25)
+    pdf.set_font("Helvetica", "I", 8)
+    pdf.cell(0, 5, _txt("Cotizador 3D Pro+ - Precio estimado, sujeto a revisión del archivo."),
+             align="C")
+
+    return pdf.output(dest="S").encode("latin-1")
+
+def quote_filename(quote):
+    return f"cotizacion_{quote['id']}.pdf"
+
+
+# --- Lotes -----------------------------------------------------------------
+
+def _render_job(job):
+    quote, thumbnail = job
+    return quote_filename(quote), quote_to_pdf(quote, thumbnail)
+
+def make_executor(workers=None):
+    """Pool de procesos para PDF, pensado para crearse una vez por proceso
+
+    La app lo comparte entre sesiones (``st.cache_resource``), de modo que
+    varios lotes simultáneos se reparten los mismos ``workers`` procesos en
+    lugar de arrancar cada uno los suyos.
+    """
+    if workers is None:
+        workers = max(1, min(8, os.cpu_count() or 1))
+    return ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn"))
+
+def iter_quote_pdfs(quotes, thumbnails=None, executor=None):
+    """Genera (nombre, bytes) de cada PDF a medida que están listos
+
+    Con ``executor`` y un lote grande reparte el trabajo en sus procesos y
+    mantiene como mucho ``2 * max_workers`` documentos en vuelo, para que la
+    memoria no crezca con el tamaño del lote. Sin ``executor`` genera en serie.
+    """
+    thumbnails = thumbnails or {}
+    jobs = ((quote, thumbnails.get(quote['id'])) for quote in quotes)
+
+    if executor is None or len(quotes) < PARALLEL_THRESHOLD:
+        for job in jobs:
+            yield _render_job(job)
+        return
+
+    in_flight = 2 * executor._max_workers
+    pending = set()
+    try:
+        for job in jobs:
+            pending.add(executor.submit(_render_job, job))
+            if len(pending) >= in_flight:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+    finally:
+        # Si el consumidor abandona el lote, no dejar trabajo encolado en el pool compartido
+        for future in pending:
+            future.cancel()
+
+def write_quotes_zip(quotes, fileobj, thumbnails=None, executor=None):
+    """Escribe en ``fileobj`` un ZIP con el PDF de cada cotización
+
+    Devuelve el número de documentos escritos.
+    """
+    count = 0
+    with zipfile.ZipFile(fileobj, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for filename, pdf_bytes in iter_quote_pdfs(quotes, thumbnails, executor):
+            archive.writestr(filename, pdf_bytes)
+            count += 1
+    return count
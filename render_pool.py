@@ -0,0 +1,398 @@
+# -*- coding: utf-8 -*-
+"""
+Pool de procesos de render para el Cotizador 3D.
+
+VTK no se ejecuta en el hilo del script de Streamlit: cada worker es un
+proceso de larga vida con su propia pantalla virtual (Xvfb) y su propio
+contexto offscreen. Las sesiones envían una escena (referencia al mesh,
+colores y estilo) y reciben un PNG. Si un worker se cuelga o cae en una
+llamada GL, se reemplaza sin tumbar el servidor.
+"""
+
+import atexit
+import hashlib
+import io
+import multiprocessing as mp
+import os
+import queue
+import select
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+MESH_STORE_DIR = os.path.join(tempfile.gettempdir(), "cotizador3d_meshes")
+WORKER_MESH_CACHE = 8
+
+
+class RenderPoolBusy(RuntimeError):
+    """La cola del pool está llena; el cliente debe reintentar más tarde"""
+
+
+class RenderTimeout(RuntimeError):
+    """El render no terminó dentro del tiempo permitido"""
+
+
+class RenderError(RuntimeError):
+    """El worker falló al renderizar la escena"""
+
+
+# --- Almacén de meshes compartido entre procesos ---------------------------
+
+def _mesh_path(mesh_key):
+    return os.path.join(MESH_STORE_DIR, f"{mesh_key}.npz")
+
+def publish_mesh(vertices, faces):
+    """Guarda el mesh en el almacén compartido y devuelve su referencia"""
+    vertices = np.ascontiguousarray(vertices, dtype=np.float32)
+    faces = np.ascontiguousarray(faces, dtype=np.uint32)
+
+    digest = hashlib.sha1()
+    digest.update(vertices.tobytes())
+    digest.update(faces.tobytes())
+    mesh_key = digest.hexdigest()[:20]
+
+    if touch_mesh(mesh_key):
+        return mesh_key
+
+    os.makedirs(MESH_STORE_DIR, exist_ok=True)
+    tmp_path = f"{_mesh_path(mesh_key)}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as tmp_file:
+        np.savez(tmp_file, vertices=vertices, faces=faces)
+    os.replace(tmp_path, _mesh_path(mesh_key))
+
+    return mesh_key
+
+def touch_mesh(mesh_key):
+    """Marca el mesh como usado; devuelve False si ya no está en el almacén"""
+    try:
+        os.utime(_mesh_path(mesh_key))
+        return True
+    except OSError:
+        return False
+
+def load_mesh(mesh_key):
+    """Carga (vertices, faces) desde el almacén compartido"""
+    with np.load(_mesh_path(mesh_key)) as data:
+        return data['vertices'], data['faces']
+
+def clean_mesh_store(max_age_seconds=600):
+    """Elimina meshes que no se han usado en max_age_seconds"""
+    if not os.path.isdir(MESH_STORE_DIR):
+        return
+
+    now = time.time()
+    for name in os.listdir(MESH_STORE_DIR):
+        path = os.path.join(MESH_STORE_DIR, name)
+        try:
+            if now - os.stat(path).st_mtime > max_age_seconds:
+                os.unlink(path)
+        except OSError:
+            pass
+
+
+# --- Construcción de la escena ---------------------------------------------
+
+def hex_to_rgb(hex_color):
+    """Convierte color HEX a RGB normalizado (0-1)"""
+    hex_color = hex_color.lstrip('#')
+    return tuple(int(hex_color[i:i+2], 16) / 255 for i in (0, 2, 4))
+
+def build_plotter(pv, vertices, faces, scene, off_screen=None):
+    """Crea un plotter de pyvista con el estilo descrito en la escena"""
+    plotter = pv.Plotter(window_size=list(scene.get('window_size', (800, 600))),
+                         off_screen=off_screen)
+
+    cells = np.hstack([np.full((len(faces), 1), 3, dtype=np.int64),
+                       faces.astype(np.int64)]).flatten()
+    pv_mesh = pv.PolyData(np.asarray(vertices), cells)
+
+    # Configurar estilo de renderizado
+    vertex_colors = scene.get('vertex_colors')
+    if vertex_colors is not None:
+        colors = np.asarray(vertex_colors)[:len(vertices)] / 255.0
+        plotter.add_mesh(pv_mesh,
+                         scalars=colors,
+                         rgb=True,
+                         smooth_shading=True,
+                         show_edges=False,
+                         specular=0.5,
+                         specular_power=20)
+    else:
+        color_rgb = hex_to_rgb(scene['model_color'])
+
+        if scene.get('wireframe'):
+            plotter.add_mesh(pv_mesh,
+                             color=color_rgb,
+                             style='wireframe',
+                             line_width=1.5,
+                             opacity=0.8)
+        else:
+            plotter.add_mesh(pv_mesh,
+                             color=color_rgb,
+                             smooth_shading=True,
+                             show_edges=True,
+                             edge_color='black',
+                             line_width=0.3)
+
+    plotter.set_background(scene['background_color'])
+
+    if scene.get('show_axes', True):
+        plotter.add_axes(line_width=4)
+
+    if scene.get('show_grid'):
+        plotter.show_grid(color='gray')
+
+    plotter.camera_position = 'iso'
+    plotter.camera.azimuth = 45
+    plotter.camera.elevation = 30
+    plotter.reset_camera()
+
+    return plotter
+
+
+# --- Proceso worker --------------------------------------------------------
+
+def _die_with_parent():
+    """preexec_fn: el kernel mata al hijo si el worker muere, incluso por señal"""
+    import ctypes
+    import signal
+
+    PR_SET_PDEATHSIG = 1
+    ctypes.CDLL(None, use_errno=True).prctl(PR_SET_PDEATHSIG, signal.SIGKILL)
+
+def _start_display(startup_timeout=10.0):
+    """Arranca un Xvfb propio; Xvfb elige un display libre de forma atómica"""
+    if shutil.which("Xvfb") is None:
+        return None
+
+    read_fd, write_fd = os.pipe()
+    try:
+        proc = subprocess.Popen(
+            ["Xvfb", "-displayfd", str(write_fd), "-screen", "0", "1024x768x24", "-nolisten", "tcp"],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            pass_fds=(write_fd,),
+            preexec_fn=_die_with_parent if sys.platform.startswith("linux") else None
+        )
+    finally:
+        os.close(write_fd)
+
+    # Xvfb escribe el número de display en el fd cuando ya acepta conexiones
+    number = b""
+    deadline = time.monotonic() + startup_timeout
+    try:
+        while not number.endswith(b"\n") and time.monotonic() < deadline:
+            ready, _, _ = select.select([read_fd], [], [], max(0.0, deadline - time.monotonic()))
+            if not ready:
+                break
+            chunk = os.read(read_fd, 16)
+            if not chunk:
+                break
+            number += chunk
+    finally:
+        os.close(read_fd)
+
+    if not number.strip().isdigit():
+        proc.kill()
+        proc.wait()
+        return None
+
+    os.environ["DISPLAY"] = f":{number.strip().decode()}"
+    return proc
+
+def _render_scene(pv, meshes, scene):
+    """Renderiza una escena y devuelve los bytes PNG"""
+    from PIL import Image
+
+    mesh_key = scene['mesh_key']
+    if mesh_key in meshes:
+        meshes.move_to_end(mesh_key)
+    else:
+        meshes[mesh_key] = load_mesh(mesh_key)
+        if len(meshes) > WORKER_MESH_CACHE:
+            meshes.popitem(last=False)
+    vertices, faces = meshes[mesh_key]
+
+    plotter = build_plotter(pv, vertices, faces, scene, off_screen=True)
+    try:
+        image = plotter.screenshot(return_img=True)
+    finally:
+        plotter.close()
+
+    buffer = io.BytesIO()
+    Image.fromarray(image).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+def _worker_main(conn):
+    """Bucle del worker: recibe escenas por el pipe y responde con PNG"""
+    xvfb = _start_display()
+    meshes = OrderedDict()
+
+    try:
+        import pyvista as pv
+        pv.OFF_SCREEN = True
+        init_error = None
+    except Exception as e:
+        pv = None
+        init_error = f"pyvista no disponible: {e}"
+
+    try:
+        while True:
+            try:
+                scene = conn.recv()
+            except EOFError:
+                break
+            if scene is None:
+                break
+
+            if init_error:
+                conn.send(('error', init_error))
+                continue
+
+            try:
+                conn.send(('ok', _render_scene(pv, meshes, scene)))
+            except Exception as e:
+                conn.send(('error', f"{type(e).__name__}: {e}"))
+    finally:
+        if xvfb is not None:
+            xvfb.terminate()
+            xvfb.wait()
+
+
+class _Worker:
+    """Proceso de render y el extremo del pipe que lo comunica con el pool"""
+
+    def __init__(self, ctx):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.alive = True
+        self.renders = 0
+
+    def call(self, scene, timeout):
+        try:
+            self.conn.send(scene)
+            if not self.conn.poll(timeout):
+                self.kill()
+                raise RenderTimeout(f"El render superó {timeout:.1f} s")
+            status, payload = self.conn.recv()
+        except (EOFError, OSError):
+            self.kill()
+            raise RenderError("El worker de render terminó inesperadamente")
+
+        self.renders += 1
+        if status != 'ok':
+            raise RenderError(payload)
+        return payload
+
+    def kill(self):
+        self.alive = False
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=1)
+        self.conn.close()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout=2)
+        self.kill()
+
+
+class RenderPool:
+    """Pool acotado de workers de render con timeouts y back-pressure
+
+    Hasta ``workers`` escenas se renderizan en paralelo y hasta ``max_queue``
+    más esperan turno; por encima de eso ``render`` lanza RenderPoolBusy en
+    lugar de acumular trabajo. La espera en la cola y el render tienen
+    timeouts separados: solo se termina un worker que excede el tiempo de
+    render o que muere, y se reemplaza por uno nuevo. Si los reemplazos
+    mueren antes de su primer render, el siguiente arranque se retrasa con
+    backoff exponencial.
+    """
+
+    def __init__(self, workers=None, max_queue=32, timeout=30.0, queue_timeout=None):
+        if workers is None:
+            workers = max(1, min(4, os.cpu_count() or 1))
+
+        self._ctx = mp.get_context("spawn")
+        self._timeout = timeout
+        self._queue_timeout = timeout if queue_timeout is None else queue_timeout
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+        self._idle = queue.Queue()
+        self._workers = workers
+        self._crash_streak = 0
+        self._lock = threading.Lock()
+        self._closed = False
+
+        for _ in range(workers):
+            self._idle.put(_Worker(self._ctx))
+
+        atexit.register(self.close)
+
+    def render(self, scene, timeout=None, queue_timeout=None):
+        """Renderiza la escena en un worker libre y devuelve un PNG en bytes
+
+        ``queue_timeout`` limita la espera por un worker libre y ``timeout``
+        el render en sí, que siempre recibe su presupuesto completo.
+        """
+        timeout = self._timeout if timeout is None else timeout
+        queue_timeout = self._queue_timeout if queue_timeout is None else queue_timeout
+
+        if not self._slots.acquire(blocking=False):
+            raise RenderPoolBusy("La cola de render está llena")
+
+        try:
+            try:
+                worker = self._idle.get(timeout=queue_timeout)
+            except queue.Empty:
+                raise RenderTimeout("No hubo un worker libre a tiempo")
+
+            try:
+                return worker.call(scene, timeout)
+            finally:
+                if worker.alive:
+                    with self._lock:
+                        self._crash_streak = 0
+                    self._idle.put(worker)
+                else:
+                    self._replace(worker)
+        finally:
+            self._slots.release()
+
+    def _replace(self, dead_worker):
+        """Arranca un worker nuevo, con backoff si los anteriores no llegaron a renderizar"""
+        with self._lock:
+            if dead_worker.renders == 0:
+                self._crash_streak += 1
+            else:
+                self._crash_streak = 0
+            delay = 0.0 if self._crash_streak <= 1 else min(0.5 * 2 ** (self._crash_streak - 2), 30.0)
+
+        def spawn():
+            if not self._closed:
+                self._idle.put(_Worker(self._ctx))
+
+        if delay:
+            timer = threading.Timer(delay, spawn)
+            timer.daemon = True
+            timer.start()
+        else:
+            spawn()
+
+    def close(self):
+        """Detiene los workers que estén libres"""
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().stop()
+            except queue.Empty:
+                break